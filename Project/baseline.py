@@ -0,0 +1,76 @@
+import hashlib
+import re
+from ingest import iter_input_rows
+from ranking import GPT_FIELDS, PROMPT_COLUMNS
+
+_SCHEME_RE = re.compile(r"^(?:https?://)?(?:www\.)?", re.IGNORECASE)
+
+
+def firm_key(row):
+    """Stable identity of a firm across exhibitor list versions: name + website."""
+    name = " ".join((row.get("Firm name") or "").lower().split())
+    website = _SCHEME_RE.sub("", (row.get("Company Website") or "").strip().lower()).rstrip("/")
+    return name, website
+
+
+def input_fingerprint(row):
+    """Hash of the fields that are rendered into the prompt."""
+    payload = "\x1f".join(row.get(column) or "" for column in PROMPT_COLUMNS.values())
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BaselineIndex:
+    """Previously scored output, used to carry unchanged firms' GPT columns forward.
+
+    Only rows with a numeric score are reused; firms that failed in the
+    baseline are treated as changed and scored again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        for row in iter_input_rows(path):
+            fields = tuple(row.get(field, "") for field in GPT_FIELDS)
+            self.entries[firm_key(row)] = (input_fingerprint(row), fields)
+        self.seen = set()
+        self.unchanged = 0
+        self.changed = 0
+        self.rescored = 0
+        self.added = 0
+        self.carried = 0
+
+    def fields_for(self, row):
+        """GPT fields to reuse for this row, or None if it has to be scored."""
+        entry = self.entries.get(firm_key(row))
+        if entry is None or entry[0] != input_fingerprint(row) or not entry[1][0].isdigit():
+            return None
+        return entry[1]
+
+    def lookup(self, row):
+        """Like fields_for, but also counts the row as unchanged, changed, rescored or added.
+
+        Call it once per input row; "rescored" firms have unchanged inputs but
+        no score in the baseline.
+        """
+        key = firm_key(row)
+        self.seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.added += 1
+            return None
+        if entry[0] != input_fingerprint(row):
+            self.changed += 1
+            return None
+        if not entry[1][0].isdigit():
+            self.rescored += 1
+            return None
+        self.unchanged += 1
+        return entry[1]
+
+    def summary(self):
+        removed = len(self.entries.keys() - self.seen)
+        return (
+            f"Baseline {self.path}: {self.unchanged} unchanged, {self.changed} changed, "
+            f"{self.rescored} rescored (no score in the baseline), {self.added} added, {removed} removed; "
+            f"{self.carried} API calls avoided"
+        )
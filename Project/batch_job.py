@@ -0,0 +1,81 @@
+import json
+import time
+from ranking import MODEL, TEMPERATURE, build_company_messages
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def custom_id_for(nr):
+    return f"nr-{nr}"
+
+
+def nr_from_custom_id(custom_id):
+    return custom_id[len("nr-"):] if custom_id.startswith("nr-") else custom_id
+
+
+def write_batch_file(path, rows, model=MODEL, temperature=TEMPERATURE):
+    """Write one chat completion request per row in the Batch API JSONL format."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as batch_file:
+        for row in rows:
+            request = {
+                "custom_id": custom_id_for(row["Nr"]),
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": {
+                    "model": model,
+                    "messages": build_company_messages(row),
+                    "temperature": temperature
+                }
+            }
+            batch_file.write(json.dumps(request, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def submit_batch_file(client, path):
+    with open(path, "rb") as batch_file:
+        uploaded = client.files.create(file=batch_file, purpose="batch")
+    return client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=ENDPOINT,
+        completion_window=COMPLETION_WINDOW
+    )
+
+
+def wait_for_batch(client, batch_id, poll_interval=30.0):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""
+        print(f"Batch {batch.id}: {batch.status}{progress}")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def iter_batch_results(client, batch):
+    """Yield (Nr, completion text or None, token usage) for every line of the batch output file.
+
+    Requests that failed inside the batch yield None so the caller can retry
+    them interactively.
+    """
+    if not batch.output_file_id:
+        return
+    content = client.files.content(batch.output_file_id)
+    for line in content.iter_lines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        nr = nr_from_custom_id(result["custom_id"])
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code") != 200:
+            yield nr, None, None
+            continue
+        body = response["body"]
+        usage = body.get("usage") or {}
+        tokens = {"prompt_tokens": usage.get("prompt_tokens", 0),
+                  "completion_tokens": usage.get("completion_tokens", 0)}
+        yield nr, body["choices"][0]["message"]["content"].strip(), tokens
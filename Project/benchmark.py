@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for the scoring pipeline against the fake OpenAI server.
+
+Runs main.py end to end over IQTest.csv and enlarged copies of it, once per
+execution mode, and reports rows/sec, peak memory and request tail latency:
+
+    python Project/benchmark.py --sizes 0 1000 10000 --modes concurrent batched
+    python Project/benchmark.py --sizes 100000 --modes batched --latency lognormal:0.5,0.4 --max-in-flight 32
+
+Size 0 means the input file as it is. No API key or network access is needed;
+every mode runs with --no-cache so each run really goes through the server.
+The cold-start time of main.py (interpreter start plus imports) is measured
+first, since it is paid by every CLI start.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from fake_openai_server import DEFAULT_REPLAY_PATH, add_profile_arguments, load_replay, profile_from_args, serve
+from ingest import iter_input_rows
+from telemetry import percentile
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PATH = os.path.join(PROJECT_DIR, "main.py")
+DEFAULT_INPUT = os.path.join(PROJECT_DIR, "IQTest.csv")
+
+# main.py arguments for each execution mode
+MODES = {
+    "sequential": ["--workers", "1"],
+    "concurrent": ["--workers", "8"],
+    "batched": ["--workers", "8", "--batch-size", "5"],
+    "cascade": ["--workers", "8", "--triage-model", "gpt-4o-mini"],
+    "streaming": ["--workers", "8", "--stream"],
+    "batch-job": ["--batch-job", "--batch-poll-interval", "0.5"],
+}
+
+# (result key, column header, format) of the printed table
+RESULT_COLUMNS = [
+    ("mode", "mode", "<11"), ("rows", "rows", ">7"), ("seconds", "seconds", ">8.1f"),
+    ("rows_per_sec", "rows/s", ">8.1f"), ("peak_mb", "peak MB", ">8.1f"), ("p50_s", "p50 s", ">6.2f"),
+    ("p95_s", "p95 s", ">6.2f"), ("p99_s", "p99 s", ">6.2f"), ("retries", "retries", ">7"),
+    ("fallback_pct", "fallback%", ">9.1f"), ("failed_pct", "failed%", ">7.1f")
+]
+
+
+def enlarge_input(source, rows, path):
+    """Write the first `rows` rows of the source, repeated as often as needed, renumbered from 1.
+
+    Firm names are kept so the fake server can still replay recorded answers.
+    """
+    first = next(iter_input_rows(source), None)
+    if first is None:
+        raise ValueError(f"{source} has no rows")
+    header = list(first)
+    repeated = itertools.chain.from_iterable(iter_input_rows(source) for _ in itertools.count())
+    with open(path, "w", newline='', encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=header, extrasaction="ignore")
+        writer.writeheader()
+        for nr, row in enumerate(itertools.islice(repeated, rows), 1):
+            row["Nr"] = str(nr)
+            writer.writerow(row)
+    return path
+
+
+def _peak_rss_mb(rusage):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return rusage.ru_maxrss / scale
+
+
+def run_pipeline(input_path, mode, base_url, workdir, extra_args=()):
+    """Run main.py as a child process; returns wall time, exit code and peak RSS."""
+    output = os.path.join(workdir, f"{os.path.basename(input_path)}.{mode}.out.csv")
+    metrics = output + ".metrics.jsonl"
+    command = [
+        sys.executable, MAIN_PATH, "--input", input_path, "--output", output, "--metrics", metrics,
+        "--no-cache", "--base-url", base_url, *MODES[mode], *extra_args
+    ]
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"))
+    start = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    stderr = []
+    # Drain stderr on a thread so a chatty child cannot block on a full pipe
+    reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    reader.start()
+    _, status, rusage = os.wait4(process.pid, 0)
+    seconds = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    reader.join()
+    process.stderr.close()
+    if process.returncode != 0:
+        print(stderr[0].decode("utf-8", "replace")[-2000:], file=sys.stderr)
+    return seconds, process.returncode, _peak_rss_mb(rusage), metrics
+
+
+def measure_cold_start(runs):
+    """Median wall time of `main.py --help`: interpreter start plus module imports."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN_PATH, "--help"], stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def summarize_metrics(path):
+    """Per-run figures from a metrics sidecar.
+
+    A row can have two records (a batch-job failure retried interactively);
+    rows and parse rates count each Nr once by its last record, while
+    latencies and retries include every request.
+    """
+    retries = 0
+    latencies = []
+    outcomes = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            if record["requests"]:
+                latencies.append(record["latency_s"])
+                retries += record["retries"]
+            outcomes[record["nr"]] = (record["source"], record["parse_path"])
+    parse_paths = [parse_path for source, parse_path in outcomes.values()
+                   if source in ("model", "cache", "batch_job")]
+    parsed = len(parse_paths)
+    fallback = parse_paths.count("fallback")
+    failed = parse_paths.count("failed")
+    latencies.sort()
+    return {
+        "rows": len(outcomes),
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "p99_s": percentile(latencies, 0.99),
+        "retries": retries,
+        "fallback_pct": 100.0 * fallback / parsed if parsed else 0.0,
+        "failed_pct": 100.0 * failed / parsed if parsed else 0.0
+    }
+
+
+def format_header():
+    # Header cells reuse each column's alignment and width, without the precision
+    return "  ".join(format(title, fmt.split(".")[0].rstrip("df")) for _, title, fmt in RESULT_COLUMNS)
+
+
+def format_row(result):
+    return "  ".join(format(result[key], fmt) for key, _, fmt in RESULT_COLUMNS)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scoring pipeline against a fake OpenAI server.")
+    parser.add_argument("--input", default=DEFAULT_INPUT, help="Input CSV/XLSX used as the seed data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000],
+                        help="Row counts to benchmark; 0 runs the input as it is")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=["sequential", "concurrent", "batched"])
+    parser.add_argument("--workdir", default=None, help="Where inputs, outputs and metrics go (default: a temp dir)")
+    parser.add_argument("--no-prefilter", action="store_true", help="Send every row to the (fake) model")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    parser.add_argument("--cold-start-runs", type=int, default=5,
+                        help="main.py starts timed for the cold-start measurement (0 to skip)")
+    parser.add_argument("--batch-delay", type=float, default=1.0,
+                        help="Seconds a fake batch job stays in progress")
+    add_profile_arguments(parser)
+    parser.set_defaults(latency="lognormal:0.1,0.5", replay=DEFAULT_REPLAY_PATH)
+    parser.add_argument("--no-replay", dest="replay", action="store_const", const=None,
+                        help="Answer every firm with generated rows instead of output_5Aug.csv")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fdi-benchmark-")
+    os.makedirs(workdir, exist_ok=True)
+
+    cold_start = None
+    if args.cold_start_runs > 0:
+        cold_start = measure_cold_start(args.cold_start_runs)
+        print(f"Cold start (main.py --help): {cold_start:.2f}s, median of {args.cold_start_runs} runs")
+
+    replay = load_replay(args.replay) if args.replay else None
+    server = serve("127.0.0.1", 0, args.batch_delay, profile_from_args(args), replay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    extra_args = ["--no-prefilter"] if args.no_prefilter else []
+
+    print(f"Fake server at {base_url}: latency {args.latency}, {args.error_rate:.0%} errors, "
+          f"{args.rate_limit_rate:.0%} 429s, {args.malformed_rate:.0%} malformed, "
+          f"max in flight {args.max_in_flight or 'unlimited'}; files in {workdir}")
+    print(format_header())
+
+    results = []
+    try:
+        for size in args.sizes:
+            input_path = args.input
+            if size:
+                input_path = enlarge_input(args.input, size, os.path.join(workdir, f"input_{size}.csv"))
+            for mode in args.modes:
+                # Same seed for every run, so modes see the same sequence of faults
+                server.state.profile = profile_from_args(args)
+                seconds, returncode, peak_mb, metrics_path = run_pipeline(
+                    input_path, mode, base_url, workdir, extra_args
+                )
+                if returncode != 0:
+                    print(f"❌ {mode} on {os.path.basename(input_path)} exited with {returncode}")
+                    continue
+                result = {"mode": mode, "input": input_path, "seconds": seconds, "peak_mb": peak_mb,
+                          **summarize_metrics(metrics_path)}
+                result["rows_per_sec"] = result["rows"] / seconds if seconds > 0 else 0.0
+                results.append(result)
+                print(format_row(result))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"cold_start_s": cold_start, "runs": results}, file, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
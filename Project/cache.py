@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.sqlite3")
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def cache_key(model, temperature, messages):
+    # The rendered prompt is part of the key, so editing the template or the
+    # firm's input fields produces a new key and old entries simply age out.
+    payload = json.dumps([model, temperature, messages], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of chat completions keyed by a hash of the full request."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, refresh=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " completion TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key, accept=None):
+        """Cached completion for key, or None; entries `accept` rejects count as misses."""
+        if self.refresh:
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT completion, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1]) or (accept is not None and not accept(row[0])):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, completion):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, completion, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, completion, now, now)
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    def evict(self):
+        with self._lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = (100.0 * self.hits / lookups) if lookups else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), {self.writes} stored"
+
+    def _expired(self, created_at):
+        return self.max_age_days is not None and created_at < time.time() - self.max_age_days * 86400
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class AdaptiveLimiter:
+    """Caps the number of in-flight API requests and adapts the cap to throttling.
+
+    The cap is halved when the API answers with a rate limit (at most once per
+    cooldown window, so one burst of 429s only shrinks it once) and grows back by
+    one after a full window of successful requests.
+    """
+
+    def __init__(self, max_in_flight, min_in_flight=1, cooldown=2.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.cooldown = cooldown
+        self.limit = self.max_in_flight
+        self.throttle_count = 0
+        self._in_flight = 0
+        self._successes = 0
+        self._last_shrink = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_in_flight and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+
+    def on_throttle(self):
+        with self._cond:
+            self.throttle_count += 1
+            self._successes = 0
+            now = time.monotonic()
+            if now - self._last_shrink < self.cooldown:
+                return
+            self._last_shrink = now
+            new_limit = max(self.min_in_flight, self.limit // 2)
+            if new_limit < self.limit:
+                print(f"⚠️ Rate limited, reducing concurrency {self.limit} -> {new_limit}")
+                self.limit = new_limit
+
+
+def run_ordered(func, items, max_workers):
+    """Apply func to items on a thread pool and yield (item, result) in input order.
+
+    Only a bounded window of items is submitted ahead of the one being yielded,
+    so results that complete out of order are buffered without reading the
+    whole input up front.
+    """
+    window = max(1, max_workers) * 2
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            for item in items:
+                pending.append((item, executor.submit(func, item)))
+                if len(pending) >= window:
+                    head, future = pending.popleft()
+                    yield head, future.result()
+            while pending:
+                head, future = pending.popleft()
+                yield head, future.result()
+        finally:
+            # On interruption, don't start work that nobody will consume
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI chat completion, Files and Batch endpoints.
+
+Lets the scoring pipeline run offline, e.g.:
+
+    python Project/fake_openai_server.py --port 8080
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=test python Project/main.py --batch-job
+
+Chat completions can be made to behave like the real API under load: with a
+latency distribution, random server errors and 429s, a concurrency cap that
+answers 429 when exceeded, and malformed responses of the kinds GPT-4 returned
+in output_5Aug.csv. With --replay, firms found in a scored output are answered
+with their recorded GPT columns, including the non-table refusals.
+"""
+import argparse
+import csv
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_FIRM_NAME_RE = re.compile(r"^Firm Name: (.*?)\s*$", re.MULTILINE)
+_NR_RE = re.compile(r"^Nr: (.*?)\s*$", re.MULTILINE)
+
+# Streamed responses: characters per chunk and the share of the latency spent before the first chunk
+STREAM_CHUNK_CHARS = 16
+FIRST_CHUNK_LATENCY_SHARE = 0.25
+
+DEFAULT_REPLAY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output_5Aug.csv")
+
+# Non-table answers seen in output_5Aug.csv; the pipeline has to fall back on free-text parsing
+REFUSAL_TEMPLATES = [
+    "Apologies, but I cannot perform the analysis as the provided data for the company \"{name}\" "
+    "is incomplete. Please provide the necessary information about the company for analysis.",
+    "As an AI, I am unable to browse the internet and gather data from external sources. "
+    "Based on the provided data, {name} appears to be active in hydrogen.\n\nScore: {score}\n\n"
+    "The company has no known presence in the Netherlands.",
+    "**Analysis of {name}**\n\nFDI Potential Score: {score}/100\n\n"
+    "{name} is expanding in Europe. Possible partners include the Port of Rotterdam and TNO.\n\n"
+    "Sources: company website and LinkedIn page.",
+    "```\n| Firm Name | Score | Explanation |\n|---|---|---|\n| {name} | {score} | Limited information. |\n```",
+]
+
+
+def _stable_score(name):
+    return int(hashlib.sha256(name.encode("utf-8")).hexdigest(), 16) % 101
+
+
+def load_replay(path):
+    """Recorded GPT columns of a scored output, keyed by firm name."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        return {
+            row["Firm name"]: (
+                row["GPT Score"], row["GPT Score Explanation"],
+                row["GPT Dutch Ecosystem Fit & Chain Partners"], row["GPT Sources Details"]
+            )
+            for row in csv.DictReader(file)
+        }
+
+
+def _firm_cells(name, replay):
+    recorded = replay.get(name) if replay else None
+    if recorded is not None:
+        return list(recorded)
+    return [
+        str(_stable_score(name)),
+        f"{name} shows moderate interest in the European energy market.",
+        "Possible partners around the Port of Rotterdam.",
+        "Website: pilot project announced with a European utility."
+    ]
+
+
+def canned_content(prompt, replay=None):
+    """Answer a single-firm or batched prompt with deterministic table rows.
+
+    Firms whose recorded score is N/A get the recorded free text instead of a
+    table row; in a batch they are left out, as the model does with firms it
+    cannot score.
+    """
+    names = _FIRM_NAME_RE.findall(prompt)
+    nrs = _NR_RE.findall(prompt)
+    rows = []
+    for index, name in enumerate(names):
+        cells = _firm_cells(name, replay)
+        if not cells[0].strip().isdigit():
+            if not nrs:
+                return cells[1]
+            continue
+        cells = [name, *(" ".join(cell.replace("|", "/").split()) for cell in cells)]
+        if nrs:
+            cells.insert(0, nrs[index])
+        rows.append("| " + " | ".join(cells) + " |")
+    return "\n".join(rows)
+
+
+def malformed_content(prompt, variant):
+    name = (_FIRM_NAME_RE.findall(prompt) or ["the company"])[0]
+    template = REFUSAL_TEMPLATES[variant % len(REFUSAL_TEMPLATES)]
+    return template.format(name=name, score=_stable_score(name))
+
+
+def parse_latency(spec):
+    """Build a latency sampler from "fixed:S", "uniform:A,B", "normal:MEAN,SD",
+    "lognormal:MEDIAN,SIGMA" or "exponential:MEAN" (all in seconds)."""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",")] if params else []
+        if kind == "fixed":
+            seconds, = values
+            return lambda rng: seconds
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == "normal":
+            mean, sd = values
+            return lambda rng: max(0.0, rng.gauss(mean, sd))
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: median * rng.lognormvariate(0.0, sigma)
+        if kind == "exponential":
+            mean, = values
+            return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency distribution {spec!r}")
+
+
+class FaultProfile:
+    """How the fake chat completion endpoint misbehaves; all draws come from one seeded RNG."""
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, rate_limit_rate=0.0, max_in_flight=0,
+                 retry_after=1.0, malformed_rate=0.0, seed=0):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Return (outcome, latency in seconds, malformed response variant) for one request."""
+        with self._lock:
+            roll = self._rng.random()
+            latency = self.sample_latency(self._rng)
+            malformed = self._rng.random() < self.malformed_rate
+            variant = self._rng.randrange(len(REFUSAL_TEMPLATES))
+        if roll < self.rate_limit_rate:
+            return "rate_limited", latency, variant
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error", latency, variant
+        return ("malformed" if malformed else "ok"), latency, variant
+
+
+def chat_completion(body, content=None, replay=None):
+    prompt = body["messages"][-1]["content"]
+    if content is None:
+        content = canned_content(prompt, replay)
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content}
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+class FakeOpenAIState:
+    def __init__(self, batch_delay=1.0, profile=None, replay=None):
+        self.batch_delay = batch_delay
+        self.profile = profile or FaultProfile()
+        self.replay = replay
+        self.files = {}
+        self.batches = {}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {"ok": 0, "malformed": 0, "error": 0, "rate_limited": 0}
+        self._ids = itertools.count(1)
+
+    def new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    def add_file(self, filename, purpose, data):
+        file_id = self.new_id("file")
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "data": data
+        }
+        return file_id
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = self.new_id("batch")
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}
+        }
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return self.batches[batch_id]
+
+    def _run_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        lines = self.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines()
+        requests = [json.loads(line) for line in lines if line.strip()]
+        batch["request_counts"]["total"] = len(requests)
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        time.sleep(self.batch_delay)
+
+        output = []
+        for request in requests:
+            output.append(json.dumps({
+                "id": self.new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": self.new_id("req"),
+                    "body": chat_completion(request["body"], replay=self.replay)
+                },
+                "error": None
+            }))
+            batch["request_counts"]["completed"] += 1
+        batch["output_file_id"] = self.add_file(f"{batch_id}_output.jsonl", "batch_output",
+                                                ("\n".join(output) + "\n").encode("utf-8"))
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_bytes(self, data):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _not_found(self):
+        self._send_json({"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}}, 404)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self._read_body()
+        if path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body))
+        elif path.endswith("/files"):
+            self._upload_file(body)
+        elif path.endswith("/batches"):
+            params = json.loads(body)
+            self._send_json(self.state.create_batch(
+                params["input_file_id"], params["endpoint"], params["completion_window"]
+            ))
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+        if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in self.state.batches:
+            self._send_json(self.state.batches[parts[-1]])
+        elif len(parts) >= 3 and parts[-1] == "content" and parts[-2] in self.state.files:
+            self._send_bytes(self.state.files[parts[-2]]["data"])
+        elif len(parts) >= 2 and parts[-2] == "files" and parts[-1] in self.state.files:
+            self._send_json({k: v for k, v in self.state.files[parts[-1]].items() if k != "data"})
+        else:
+            self._not_found()
+
+    def _send_error(self, status, message, error_type, code=None, headers=None):
+        data = json.dumps({"error": {"message": message, "type": error_type, "code": code}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chat_completion(self, body):
+        state = self.state
+        profile = state.profile
+        outcome, latency, variant = profile.draw()
+        with state.lock:
+            if profile.max_in_flight and state.in_flight >= profile.max_in_flight:
+                outcome = "rate_limited"
+            if outcome != "rate_limited":
+                state.in_flight += 1
+            state.counts[outcome] += 1
+
+        if outcome == "rate_limited":
+            retry_after = profile.retry_after
+            self._send_error(429, f"Rate limit reached for {body.get('model', 'gpt-4')}. Please try again.",
+                             "requests", "rate_limit_exceeded",
+                             {"retry-after-ms": str(int(retry_after * 1000)),
+                              "Retry-After": str(max(1, round(retry_after)))})
+            return
+        try:
+            if outcome == "error":
+                time.sleep(latency)
+                self._send_error(500, "The server had an error while processing your request.", "server_error")
+                return
+            content = None
+            if outcome == "malformed":
+                content = malformed_content(body["messages"][-1]["content"], variant)
+            completion = chat_completion(body, content, state.replay)
+            if body.get("stream"):
+                self._send_stream(completion, latency, (body.get("stream_options") or {}).get("include_usage"))
+            else:
+                time.sleep(latency)
+                self._send_json(completion)
+        finally:
+            with state.lock:
+                state.in_flight -= 1
+
+    def _send_stream(self, completion, latency, include_usage):
+        """Send a completion as server-sent chunks, spreading the latency over them."""
+        content = completion["choices"][0]["message"]["content"]
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+        chunk_delay = latency * (1 - FIRST_CHUNK_LATENCY_SHARE) / max(1, len(pieces))
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": completion["id"], "object": "chat.completion.chunk",
+                "created": completion["created"], "model": completion["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+
+        events = [chunk({"role": "assistant", "content": piece}) for piece in pieces]
+        events.append(chunk({}, "stop"))
+        if include_usage:
+            events.append({**chunk({}), "choices": [], "usage": completion["usage"]})
+
+        time.sleep(latency * FIRST_CHUNK_LATENCY_SHARE)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        try:
+            for index, event in enumerate(events):
+                if index and index < len(pieces):
+                    time.sleep(chunk_delay)
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading once it had what it needed
+            pass
+
+    def _upload_file(self, body):
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+        fields, filename, data = {}, "upload.jsonl", b""
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                filename = part.get_filename() or filename
+                data = part.get_payload(decode=True)
+            else:
+                fields[name] = part.get_content().strip()
+        file_id = self.state.add_file(filename, fields.get("purpose", "batch"), data)
+        self._send_json({k: v for k, v in self.state.files[file_id].items() if k != "data"})
+
+
+def serve(host="127.0.0.1", port=8080, batch_delay=1.0, profile=None, replay=None):
+    state = FakeOpenAIState(batch_delay=batch_delay, profile=profile, replay=replay)
+    handler = type("BoundFakeOpenAIHandler", (FakeOpenAIHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0",
+                        help="Latency distribution: fixed:S, uniform:A,B, normal:MEAN,SD, "
+                             "lognormal:MEDIAN,SIGMA or exponential:MEAN (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--max-in-flight", type=int, default=0,
+                        help="Answer 429 while this many requests are in progress (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After sent with 429 responses")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of responses replaced by non-table answers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", nargs="?", const=DEFAULT_REPLAY_PATH, default=None,
+                        help="Answer firms found in this scored output with their recorded columns "
+                             "(default: output_5Aug.csv)")
+
+
+def profile_from_args(args):
+    return FaultProfile(
+        latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        max_in_flight=args.max_in_flight, retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI server for offline runs and benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-delay", type=float, default=1.0,
+                        help="Seconds a batch job stays in progress before completing")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    replay = load_replay(args.replay) if args.replay else None
+    server = serve(args.host, args.port, args.batch_delay, profile_from_args(args), replay)
+    print(f"✅ Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
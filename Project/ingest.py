@@ -0,0 +1,121 @@
+import csv
+import datetime
+import operator
+import os
+import re
+from ranking import PROMPT_COLUMNS
+
+# Columns the pipeline reads by name; every row gets them, empty if the input lacks them
+REQUIRED_COLUMNS = ["Nr", "Firm name"] + [c for c in PROMPT_COLUMNS.values() if c != "Firm name"]
+
+_NUMBERING_RE = re.compile(r"^\d+\.\s*")
+
+
+def _header_key(name):
+    # "1. Firm name" and "3. Booth-nr" in the Excel export mean "Firm name" and "Booth nr"
+    name = _NUMBERING_RE.sub("", str(name or "").strip())
+    return " ".join(name.replace("-", " ").replace("_", " ").lower().split())
+
+
+_CANONICAL_BY_KEY = {_header_key(column): column for column in REQUIRED_COLUMNS}
+
+
+def normalize_header(header):
+    return [_CANONICAL_BY_KEY.get(_header_key(name), str(name or "").strip()) for name in header]
+
+
+def _cell_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _iter_dict_rows(header, value_rows):
+    """Turn value lists into dicts keyed by the (normalized) header.
+
+    The header is inspected once: missing required columns become constant
+    defaults and a missing Nr column is numbered from 1.
+    """
+    header = normalize_header(header)
+    width = len(header)
+    padding = [""] * width
+    defaults = {column: "" for column in REQUIRED_COLUMNS if column not in header}
+    number_rows = "Nr" in defaults
+    for index, values in enumerate(value_rows, 1):
+        if len(values) < width:
+            values = list(values) + padding[len(values):]
+        row = dict(zip(header, values))
+        if defaults:
+            row.update(defaults)
+            if number_rows:
+                row["Nr"] = str(index)
+        yield row
+
+
+def iter_csv_rows(path):
+    """Yield CSV rows as dicts without loading the file into memory."""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield from _iter_dict_rows(header, (values for values in reader if any(values)))
+
+
+def iter_xlsx_rows(path, sheet=None):
+    """Yield rows of an Excel sheet as dicts using openpyxl's read-only streaming mode.
+
+    Without a sheet name the first visible sheet is used, which skips the hidden
+    cache sheet in the exported fair lists.
+    """
+    try:
+        import openpyxl
+    except ImportError as e:
+        raise ImportError("Reading .xlsx input requires openpyxl: pip install openpyxl") from e
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        if sheet is not None:
+            worksheet = workbook[sheet]
+        else:
+            visible = [ws for ws in workbook.worksheets if ws.sheet_state == "visible"]
+            worksheet = visible[0] if visible else workbook.worksheets[0]
+
+        value_rows = worksheet.iter_rows(values_only=True)
+        header = next(value_rows, None)
+        if header is None:
+            return
+        # Trailing empty header cells are formatting leftovers, not columns
+        header = list(header)
+        while header and header[-1] in (None, ""):
+            header.pop()
+        width = len(header)
+        text_rows = (
+            [_cell_text(value) for value in values[:width]]
+            for values in value_rows
+            if any(value not in (None, "") for value in values[:width])
+        )
+        yield from _iter_dict_rows(header, text_rows)
+    finally:
+        workbook.close()
+
+
+def iter_input_rows(path, sheet=None):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return iter_xlsx_rows(path, sheet)
+    return iter_csv_rows(path)
+
+
+def column_getter(columns):
+    """Precompiled accessor returning a tuple of the given columns from a row dict."""
+    if not columns:
+        return lambda row: ()
+    if len(columns) == 1:
+        getter = operator.itemgetter(columns[0])
+        return lambda row: (getter(row),)
+    return operator.itemgetter(*columns)
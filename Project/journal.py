@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+
+
+def journal_path_for(output_file):
+    return output_file + ".journal.jsonl"
+
+
+class RunJournal:
+    """Append-only record of finished rows, fsynced per row so a crash loses nothing.
+
+    Each line holds one row's Nr, status, parsed GPT fields and raw response.
+    When a row is recorded more than once (e.g. by a --retry-failed pass) the
+    last line wins. Only the status and fields are kept in `entries`, so memory
+    does not grow with the response text.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.entries = {}
+        if resume:
+            self._load()
+        elif os.path.exists(path):
+            os.remove(path)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write can leave one truncated trailing line
+                    continue
+                self.entries[entry["nr"]] = {"status": entry["status"], "fields": entry["fields"]}
+
+    def is_done(self, nr, retry_failed=False):
+        entry = self.entries.get(nr)
+        if entry is None:
+            return False
+        return not (retry_failed and entry["status"] == STATUS_FAILED)
+
+    def record(self, nr, status, fields, response="", sync=True):
+        entry = {"nr": nr, "status": status, "fields": list(fields), "response": response}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+            self.entries[nr] = {"status": status, "fields": entry["fields"]}
+        return entry
+
+    def failed(self):
+        return [nr for nr, entry in self.entries.items() if entry["status"] == STATUS_FAILED]
+
+    def close(self):
+        self._file.close()
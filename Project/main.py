@@ -1,133 +1,410 @@
+import argparse
 import csv
-import re
-from ranking import read_csv, get_company_analysis
+import itertools
+import os
+import threading
+import time
+from baseline import BaselineIndex
+from batch_job import iter_batch_results, submit_batch_file, wait_for_batch, write_batch_file
+from cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_ENTRIES, ResponseCache
+from concurrency import AdaptiveLimiter, run_ordered
+from ingest import column_getter, iter_input_rows
+from journal import STATUS_FAILED, STATUS_OK, RunJournal, journal_path_for
+from prefilter import SectorPrefilter, prefilter_reason
+from ranking import DEFAULT_TIMEOUT_SECONDS, GPT_FIELDS, MAX_RETRIES, MODEL, TEMPERATURE, CompanyAnalyzer
+from response_parser import parse_analysis, parse_analysis_with_path, split_batch_response
+from telemetry import RunTelemetry
 
+# Marks rows in a work batch whose result is already in the run journal
+JOURNALED = object()
+# Upper bound on rows per work batch, counting journaled and locally scored rows too
+MAX_WORK_BATCH_ROWS = 100
 
-def parse_markdown_row(markdown_row):
-    parts = markdown_row.strip().strip("|").split("|")
-    return [part.strip() for part in parts]
+
+def call_share(call_metrics, tier, batch_size=1):
+    """Per-row share of one analyzer call; token usage is split across a batch."""
+    prompt_tokens = call_metrics["prompt_tokens"] // batch_size
+    completion_tokens = call_metrics["completion_tokens"] // batch_size
+    return {
+        "tier": tier,
+        "model": call_metrics["model"],
+        "batch_size": batch_size,
+        "cached": call_metrics["cached"],
+        "requests": call_metrics["requests"],
+        "retries": call_metrics["retries"],
+        "latency_s": call_metrics["latency_s"],
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_by_model": {call_metrics["model"]: (prompt_tokens, completion_tokens)}
+    }
+
+
+def merge_metrics(first, second):
+    """Combine the metrics of two calls for the same row; the later call labels the row."""
+    merged = dict(second)
+    for key in ("requests", "retries", "latency_s", "prompt_tokens", "completion_tokens"):
+        merged[key] = first[key] + second[key]
+    tokens_by_model = dict(first["tokens_by_model"])
+    for model, (prompt_tokens, completion_tokens) in second["tokens_by_model"].items():
+        previous = tokens_by_model.get(model, (0, 0))
+        tokens_by_model[model] = (previous[0] + prompt_tokens, previous[1] + completion_tokens)
+    merged["tokens_by_model"] = tokens_by_model
+    merged["cached"] = first["cached"] and second["cached"]
+    return merged
+
+
+def needs_escalation(markdown_row, escalation_band):
+    """True if a triage response is unparseable or its score is inside the uncertainty band."""
+    score = parse_analysis(markdown_row)[0]
+    if not score.isdigit():
+        return True
+    low, high = escalation_band
+    return low <= int(score) <= high
+
+
+def cascade_summary(tier_stats):
+    triage, full = tier_stats["triage"], tier_stats["full"]
+    rate = (100.0 * full["rows"] / triage["rows"]) if triage["rows"] else 0.0
+    lines = [f"Cascade: {full['rows']} of {triage['rows']} triaged firms escalated ({rate:.1f}%)"]
+    for tier, stats in (("triage", triage), ("full", full)):
+        mean = stats["seconds"] / stats["requests"] if stats["requests"] else 0.0
+        lines.append(f"  {tier}: {stats['requests']} requests, {stats['seconds']:.1f}s in requests, "
+                     f"{mean:.2f}s mean per request")
+    return "\n".join(lines)
+
+
+def run_batch_job(args, analyzer, journal, finish, baseline=None):
+    """Score all pending rows through the Batch API and record the results in the journal.
+
+    Rows with a cached completion are finished straight away instead of being
+    submitted, and every completion the batch returns is added to the cache.
+    """
+    def pending_rows():
+        for row in iter_input_rows(args.input, args.sheet):
+            if (journal.is_done(row["Nr"], retry_failed=args.retry_failed)
+                    or (not args.no_prefilter and prefilter_reason(row) is not None)
+                    or (baseline is not None and baseline.fields_for(row) is not None)):
+                continue
+            cached = analyzer.cached_analysis(row)
+            if cached is not None:
+                call_metrics = {"model": analyzer.model, "cached": True, "requests": 0, "retries": 0,
+                                "latency_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+                finish(row, cached, call_share(call_metrics, "full"))
+                continue
+            yield row
+
+    batch_file = args.output + ".batch.jsonl"
+    count = write_batch_file(batch_file, pending_rows(), analyzer.model, analyzer.temperature)
+    if not count:
+        return
+    # File and batch bookkeeping calls are cheap, so let the client retry them itself
+    client = analyzer.client.with_options(max_retries=2)
+    start = time.monotonic()
+    batch = submit_batch_file(client, batch_file)
+    print(f"Submitted batch {batch.id} with {count} requests")
+    batch = wait_for_batch(client, batch.id, args.batch_poll_interval)
+
+    responses = {nr: (markdown_row, usage) for nr, markdown_row, usage in iter_batch_results(client, batch)
+                 if markdown_row is not None}
+    received = 0
+    # Second pass over the input so only the responses, not the rows, are held in memory
+    for row in iter_input_rows(args.input, args.sheet):
+        markdown_row, usage = responses.pop(row["Nr"], (None, None))
+        if markdown_row is not None:
+            analyzer.store_analysis(row, markdown_row)
+            call_metrics = {"model": analyzer.model, "cached": False, "requests": 0, "retries": 0,
+                            "latency_s": 0.0, **usage}
+            finish(row, markdown_row, call_share(call_metrics, "full"), source="batch_job")
+            received += 1
+    print(f"Batch job {batch.id} {batch.status}: {received} of {count} rows returned "
+          f"in {time.monotonic() - start:.1f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score trade fair participants for Dutch FDI potential.")
+    parser.add_argument("--input", default="Project/IQTest.csv", help="Input .csv or .xlsx file")
+    parser.add_argument("--sheet", default=None, help="Worksheet to read from an .xlsx input (default: first visible)")
+    parser.add_argument("--output", default="Project/output.csv", help="Output CSV file")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Maximum number of OpenAI requests in flight at once")
+    parser.add_argument("--model", default=MODEL, help="OpenAI chat model used for scoring")
+    parser.add_argument("--triage-model", default=None,
+                        help="Cheaper model for a first pass; only uncertain firms are re-scored with --model")
+    parser.add_argument("--escalation-band", type=int, nargs=2, default=[30, 70], metavar=("LOW", "HIGH"),
+                        help="Triage scores in this inclusive range are re-scored with --model")
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE, help="Sampling temperature")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help="Per-request timeout in seconds")
+    parser.add_argument("--base-url", default=None,
+                        help="Alternative OpenAI-compatible endpoint (defaults to OPENAI_BASE_URL or api.openai.com)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Number of firms analyzed per request (1 sends one request per firm)")
+    parser.add_argument("--batch-job", action="store_true",
+                        help="Submit all rows as an offline Batch API job, then retry leftovers interactively")
+    parser.add_argument("--batch-poll-interval", type=float, default=30.0,
+                        help="Seconds between Batch API status checks")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions and stop reading once the table row is complete")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES,
+                        help="Retries per row on rate limits and transient API errors")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip rows already recorded in the run journal of the output file")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Like --resume, but also re-run rows that errored or failed to parse")
+    parser.add_argument("--baseline", default=None,
+                        help="Previous scored output; firms with unchanged input fields keep their GPT columns")
+    parser.add_argument("--metrics", default=None,
+                        help="Per-row metrics sidecar, .jsonl or .csv (default: <output>.metrics.jsonl)")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="Send every row to the model instead of scoring clear rejects locally")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="SQLite file for cached responses")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache entirely")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Ignore cached responses but store the fresh ones")
+    parser.add_argument("--cache-max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Evict least recently used responses beyond this many entries")
+    parser.add_argument("--cache-max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help="Evict responses older than this many days")
+    return parser.parse_args()
 
 
 def main():
-    input_file = "Project/IQTest.csv"
-    output_file = "Project/output.csv"
+    args = parse_args()
+    input_file = args.input
+    output_file = args.output
 
-    input_data = read_csv(input_file)
+    input_rows = iter_input_rows(input_file, args.sheet)
+    first_row = next(input_rows, None)
 
-    if not input_data:
+    if first_row is None:
         print("No data found.")
         return
 
-    original_headers = list(input_data[0].keys())
-
-    gpt_fields = [
-        "GPT Score",
-        "GPT Score Explanation",
-        "GPT Dutch Ecosystem Fit & Chain Partners",
-        "GPT Sources Details"
-    ]
+    input_rows = itertools.chain([first_row], input_rows)
+    original_headers = list(first_row.keys())
 
     reordered_headers = (
         ["Nr", "Firm name"]
-        + gpt_fields
+        + GPT_FIELDS
         + [field for field in original_headers if field not in ["Nr", "Firm name"]]
     )
 
-    with open(output_file, "w", newline='', encoding="utf-8") as out_csv:
-        writer = csv.DictWriter(out_csv, fieldnames=reordered_headers)
-        writer.writeheader()
-
-        for idx, row in enumerate(input_data, 1):
-            print(f"Processing row {idx}: {row.get('Firm name')}")
-            markdown_row = get_company_analysis(row)
-            print(f"AI Response for row {idx}: {markdown_row[:200]}...")
-
-            try:
-                lines = markdown_row.split('\n')
-                score = "N/A"
-                explanation = ""
-                ecosystem_fit = ""
-                sources_details = ""
-
-                for line in lines:
-                    if line.strip().startswith('|') and '|' in line and len(line.split('|')) >= 5:
-                        parsed = parse_markdown_row(line)
-                        if len(parsed) >= 5:
-                            _, score, explanation, ecosystem_fit, sources_details = parsed[:5]
-                            break
-
-                if score == "N/A":
-                    score_patterns = [
-                        r'score[:\s]*(\d{1,3})',
-                        r'rating[:\s]*(\d{1,3})',
-                        r'(\d{1,3})/100',
-                        r'(\d{1,3})\s*out\s*of\s*100',
-                        r'assessment[:\s]*(\d{1,3})'
-                    ]
-                    for line in lines:
-                        for pattern in score_patterns:
-                            match = re.search(pattern, line.lower())
-                            if match:
-                                score_val = int(match.group(1))
-                                if 0 <= score_val <= 100:
-                                    score = str(score_val)
-                                    break
-                        if score != "N/A":
-                            break
-
-                    meaningful_lines = []
-                    for line in lines:
-                        line = line.strip()
-                        if line and not line.startswith('|') and not line.startswith('ANALYSIS:') and len(line) > 20:
-                            meaningful_lines.append(line)
-                            if len(meaningful_lines) >= 3:
-                                break
-                    if meaningful_lines:
-                        explanation = ' '.join(meaningful_lines)
-                        words = explanation.split()
-                        if len(words) > 100:
-                            explanation = ' '.join(words[:100]) + "..."
-
-                    dutch_mentions = [
-                        line.strip() for line in lines
-                        if any(word in line.lower() for word in ['dutch', 'netherlands', 'amsterdam', 'rotterdam', 'eindhoven'])
-                    ]
-                    if dutch_mentions:
-                        ecosystem_fit = ' '.join(dutch_mentions[:2])
-                        words = ecosystem_fit.split()
-                        if len(words) > 100:
-                            ecosystem_fit = ' '.join(words[:100]) + "..."
-                    else:
-                        ecosystem_fit = "No specific Dutch market mention found"
-
-                    # Extract sources details from text if not found in table
-                    if not sources_details:
-                        sources_mentions = []
-                        for line in lines:
-                            if any(word in line.lower() for word in ['linkedin', 'website', 'news', 'source', 'patent', 'trade', 'industry', 'regulatory', 'publication', 'database', 'project', 'accelerator', 'portxl', 'buccaneer', 'horizon', 'interreg', 'emsa', 'imo']):
-                                sources_mentions.append(line.strip())
-                        
-                        if sources_mentions:
-                            sources_details = ' '.join(sources_mentions[:4])  # Take up to 4 sources
-                            if len(sources_details) > 250:
-                                sources_details = sources_details[:250] + "..."
-                        else:
-                            sources_details = "No specific sources mentioned"
-
-                enriched_row = {
-                    **row,
-                    gpt_fields[0]: score,
-                    gpt_fields[1]: explanation,
-                    gpt_fields[2]: ecosystem_fit,
-                    gpt_fields[3]: sources_details
-                }
-
-                ordered_row = {field: enriched_row.get(field, "") for field in reordered_headers}
-                writer.writerow(ordered_row)
-
-            except Exception as e:
-                print(f"❌ Failed to process row {idx}: {e}")
+    limiter = AdaptiveLimiter(args.workers)
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_path, max_entries=args.cache_max_entries,
+                              max_age_days=args.cache_max_age_days, refresh=args.refresh_cache)
+
+    analyzer = CompanyAnalyzer(
+        model=args.model,
+        temperature=args.temperature,
+        timeout=args.timeout,
+        max_retries=args.max_retries,
+        limiter=limiter,
+        cache=cache,
+        base_url=args.base_url,
+        stream=args.stream
+    )
+    triage_analyzer = None
+    if args.triage_model:
+        triage_analyzer = CompanyAnalyzer(
+            model=args.triage_model,
+            temperature=args.temperature,
+            timeout=args.timeout,
+            max_retries=args.max_retries,
+            limiter=limiter,
+            cache=cache,
+            base_url=args.base_url,
+            stream=args.stream
+        )
+    escalation_band = tuple(args.escalation_band)
+    prefilter = None if args.no_prefilter else SectorPrefilter()
+    baseline = BaselineIndex(args.baseline) if args.baseline else None
+    journal = RunJournal(journal_path_for(output_file), resume=args.resume or args.retry_failed)
+    # Resumed runs add to the sidecar, so it keeps the metrics of the rows scored before
+    telemetry = RunTelemetry(args.metrics or output_file + ".metrics.jsonl", append=args.resume or args.retry_failed)
+
+    retry_failed = args.retry_failed
+    batch_stats = {"batches": 0, "fallbacks": 0}
+    tier_stats = {tier: {"rows": 0, "requests": 0, "seconds": 0.0} for tier in ("triage", "full")}
+    stats_lock = threading.Lock()
+
+    def plan_batches(rows):
+        # Each work item holds up to --batch-size firms that need the model; rows that
+        # are already journaled or scored locally ride along without counting, up to
+        # MAX_WORK_BATCH_ROWS rows in total so a mostly journaled resume stays bounded.
+        batch, needs_model = [], 0
+        for row in rows:
+            # Every row is classified against the baseline once, including rows already
+            # journaled by an earlier run or by the batch job
+            carried = baseline.lookup(row) if baseline is not None else None
+            if journal.is_done(row["Nr"], retry_failed=retry_failed):
+                batch.append((row, JOURNALED))
+            else:
+                local_response = prefilter.check(row) if prefilter is not None else None
+                if local_response is None and carried is not None:
+                    # Unchanged since the baseline run: reuse its GPT columns as-is
+                    journal.record(row["Nr"], STATUS_OK, carried, "(carried over from baseline)", sync=False)
+                    telemetry.record({"nr": row["Nr"], "firm": row.get("Firm name"), "source": "baseline",
+                                      "status": STATUS_OK})
+                    baseline.carried += 1
+                    local_response = JOURNALED
+                batch.append((row, local_response))
+                if local_response is None:
+                    needs_model += 1
+            if needs_model >= args.batch_size or len(batch) >= max(MAX_WORK_BATCH_ROWS, args.batch_size):
+                yield batch
+                batch, needs_model = [], 0
+        if batch:
+            yield batch
+
+    def finish(row, markdown_row, metrics=None, source="model"):
+        nr = row["Nr"]
+        try:
+            fields, parse_path = parse_analysis_with_path(markdown_row)
+        except Exception as e:
+            print(f"❌ Failed to parse row {nr}: {e}")
+            fields, parse_path = ("N/A", "", "", ""), "failed"
+        status = STATUS_FAILED if markdown_row == "API_ERROR" or fields[0] == "N/A" else STATUS_OK
+
+        record = dict(metrics or {})
+        if source == "model" and record.get("cached") and not record.get("requests"):
+            source = "cache"
+        record.update(nr=nr, firm=row.get("Firm name"), source=source, parse_path=parse_path, status=status)
+        telemetry.record(record)
+        return journal.record(nr, status, fields, markdown_row)
+
+    def score_rows(tier_analyzer, tier, rows):
+        # Returns {Nr: markdown row} and {Nr: metrics}, batching when several firms need the same model.
+        # Tier stats count the HTTP requests actually sent (retries included, cache hits not) and
+        # the time spent in them, excluding limiter waits and backoff sleeps.
+        responses = {}
+        metrics = {}
+        requests = 0
+        seconds = 0.0
+        batch_share = None
+        if len(rows) > 1:
+            call_metrics = {}
+            batch_response = tier_analyzer.analyze_batch(rows, call_metrics)
+            batch_share = call_share(call_metrics, tier, len(rows))
+            requests += call_metrics["requests"]
+            seconds += call_metrics["latency_s"]
+            responses = split_batch_response(batch_response, rows)
+            metrics = {nr: batch_share for nr in responses}
+            missing = len(rows) - len(responses)
+            if missing:
+                print(f"⚠️ Batch response is missing {missing} of {len(rows)} firms, "
+                      f"falling back to single-firm requests")
+            with stats_lock:
+                batch_stats["batches"] += 1
+                batch_stats["fallbacks"] += missing
+        for row in rows:
+            if row["Nr"] not in responses:
+                call_metrics = {}
+                responses[row["Nr"]] = tier_analyzer.analyze(row, call_metrics)
+                row_metrics = call_share(call_metrics, tier)
+                metrics[row["Nr"]] = merge_metrics(batch_share, row_metrics) if batch_share else row_metrics
+                requests += call_metrics["requests"]
+                seconds += call_metrics["latency_s"]
+        with stats_lock:
+            tier_stats[tier]["rows"] += len(rows)
+            tier_stats[tier]["requests"] += requests
+            tier_stats[tier]["seconds"] += seconds
+        return responses, metrics
+
+    def analyze_batch(batch):
+        model_rows = [row for row, local_response in batch if local_response is None]
+        responses, metrics = {}, {}
+        if model_rows and triage_analyzer is not None:
+            responses, metrics = score_rows(triage_analyzer, "triage", model_rows)
+            escalated = [row for row in model_rows if needs_escalation(responses[row["Nr"]], escalation_band)]
+            if escalated:
+                full_responses, full_metrics = score_rows(analyzer, "full", escalated)
+                responses.update(full_responses)
+                for nr, row_metrics in full_metrics.items():
+                    metrics[nr] = merge_metrics(metrics[nr], row_metrics)
+        elif model_rows:
+            responses, metrics = score_rows(analyzer, "full", model_rows)
+
+        entries = []
+        for row, local_response in batch:
+            if local_response is JOURNALED:
+                entries.append(None)
                 continue
+            if local_response is not None:
+                entries.append(finish(row, local_response, source="prefilter"))
+            else:
+                entries.append(finish(row, responses[row["Nr"]], metrics[row["Nr"]]))
+        return entries
+
+    # Columns are resolved once; each output row is then a single tuple lookup
+    other_columns = [field for field in original_headers if field not in ["Nr", "Firm name"]]
+    other_values = column_getter(other_columns)
+
+    if args.batch_job:
+        run_batch_job(args, analyzer, journal, finish, baseline)
+        # Rows the batch job could not score are retried through the interactive path
+        retry_failed = True
+
+    # The output is assembled next to the target and swapped in atomically, so an
+    # interrupted run leaves the previous output.csv (and the journal) intact.
+    tmp_file = output_file + ".tmp"
+    try:
+        with open(tmp_file, "w", newline='', encoding="utf-8") as out_csv:
+            writer = csv.writer(out_csv)
+            writer.writerow(reordered_headers)
+
+            # Batches are analyzed concurrently but yielded back in input order
+            results = run_ordered(analyze_batch, plan_batches(input_rows), limiter.max_in_flight)
+            idx = 0
+            for batch, entries in results:
+                for (row, _), entry in zip(batch, entries):
+                    idx += 1
+                    if entry is None:
+                        entry = journal.entries[row["Nr"]]
+                        print(f"Skipping row {idx}: {row.get('Firm name')} (already scored)")
+                    else:
+                        print(f"Processing row {idx}: {row.get('Firm name')}")
+                        print(f"AI Response for row {idx}: {entry['response'][:200]}...")
+
+                    writer.writerow([row["Nr"], row["Firm name"], *entry["fields"], *other_values(row)])
+                    # Flushed per row so results show up on disk as soon as they are in order
+                    out_csv.flush()
+
+            out_csv.flush()
+            os.fsync(out_csv.fileno())
+        os.replace(tmp_file, output_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        print(f"⚠️ Run interrupted; completed rows are kept in {journal.path}. Rerun with --resume to continue.")
+        raise
+    finally:
+        journal.close()
+        telemetry.close()
+
+    failed = journal.failed()
+    if failed:
+        print(f"⚠️ {len(failed)} rows failed or could not be parsed (Nr {', '.join(failed[:20])}"
+              f"{', ...' if len(failed) > 20 else ''}). Rerun with --retry-failed to retry them.")
+    if batch_stats["batches"]:
+        print(f"Batches: {batch_stats['batches']} multi-firm requests, "
+              f"{batch_stats['fallbacks']} firms fell back to single-firm requests")
+    print(telemetry.summary())
+    if triage_analyzer is not None:
+        print(cascade_summary(tier_stats))
+    if limiter.throttle_count:
+        print(f"⚠️ Rate limited {limiter.throttle_count} times, final concurrency {limiter.limit}")
+    if prefilter is not None:
+        print(prefilter.summary())
+    if baseline is not None:
+        print(baseline.summary())
+    if cache is not None:
+        print(cache.summary())
+        cache.close()
+    analyzer.close()
+    if triage_analyzer is not None:
+        triage_analyzer.close()
 
 
 if __name__ == "__main__":
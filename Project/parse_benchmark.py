@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Golden checks and a microbenchmark for response_parser.py.
+
+The golden cases are rebuilt from the responses captured in output.csv and
+output_5Aug.csv: every scored firm as a table row (alone, wrapped in chatter,
+and inside a batched response) must parse back to its recorded columns, and
+every refusal must stay unscored with its text as the explanation. Each case
+is also streamed in small chunks and must parse the same as the full text.
+
+    python Project/parse_benchmark.py
+    python Project/parse_benchmark.py --iterations 20000 --skip-golden
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from ranking import GPT_FIELDS
+from response_parser import ResponseStream, parse_analysis, parse_analysis_with_path, split_batch_response
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_FILES = [os.path.join(PROJECT_DIR, "output.csv"), os.path.join(PROJECT_DIR, "output_5Aug.csv")]
+BATCH_SIZE = 5
+STREAM_CHUNK_CHARS = 7
+
+
+def table_row(*cells):
+    return "| " + " | ".join(cells) + " |"
+
+
+def load_golden_rows(paths=GOLDEN_FILES):
+    rows = []
+    for path in paths:
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            rows.extend(csv.DictReader(file))
+    return rows
+
+
+def golden_cases(rows):
+    """Yield (name, response, expected fields or None, expected parse path)."""
+    for row in rows:
+        fields = tuple(row[field] for field in GPT_FIELDS)
+        name = f"Nr {row['Nr']} {row['Firm name']}"
+        if fields[0].isdigit():
+            response = table_row(row["Firm name"], *fields)
+            yield f"{name} (table)", response, fields, "table"
+            yield (f"{name} (with chatter)",
+                   f"Here is the analysis:\n\n{response}\n\nNote: scores are indicative only.", fields, "table")
+        else:
+            # The recorded explanation is the refusal text the fallback parser kept
+            expected = ("N/A", fields[1], None, None)
+            yield f"{name} (refusal)", fields[1], expected, "failed"
+
+
+def _matches(expected, actual):
+    return all(e is None or e == a for e, a in zip(expected, actual))
+
+
+def stream_text(response, nrs=None):
+    stream = ResponseStream(nrs)
+    for start in range(0, len(response), STREAM_CHUNK_CHARS):
+        if stream.feed(response[start:start + STREAM_CHUNK_CHARS]):
+            break
+    return stream.text
+
+
+def run_golden(rows):
+    failures = []
+    cases = list(golden_cases(rows))
+    for name, response, expected, path in cases:
+        actual, actual_path = parse_analysis_with_path(response)
+        if actual_path != path or not _matches(expected, actual):
+            failures.append(f"{name}: expected {path} {expected}, got {actual_path} {actual}")
+        streamed = parse_analysis_with_path(stream_text(response))
+        if streamed != (actual, actual_path):
+            failures.append(f"{name}: streamed parse {streamed} differs from {(actual, actual_path)}")
+
+    scored = [row for row in rows if row[GPT_FIELDS[0]].isdigit()]
+    batches = [scored[i:i + BATCH_SIZE] for i in range(0, len(scored), BATCH_SIZE)]
+    for batch in batches:
+        # Golden files repeat Nr values, so each batch gets its own numbering
+        batch = [dict(row, Nr=str(index)) for index, row in enumerate(batch, 1)]
+        response = "\n".join(
+            table_row(row["Nr"], row["Firm name"], *(row[field] for field in GPT_FIELDS)) for row in batch
+        )
+        nrs = [row["Nr"] for row in batch]
+        split = split_batch_response(response, batch)
+        if split != split_batch_response(stream_text(response, nrs), batch):
+            failures.append(f"batch starting {batch[0]['Firm name']}: streamed split differs")
+        for row in batch:
+            expected = tuple(row[field] for field in GPT_FIELDS)
+            actual = parse_analysis(split[row["Nr"]]) if row["Nr"] in split else None
+            if actual != expected:
+                failures.append(f"batch row {row['Firm name']}: expected {expected}, got {actual}")
+    return len(cases) + len(batches), failures
+
+
+def time_per_call(func, inputs, iterations):
+    start = time.perf_counter()
+    count = 0
+    while count < iterations:
+        for value in inputs:
+            func(value)
+        count += len(inputs)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run_microbenchmark(rows, iterations):
+    scored = [row for row in rows if row[GPT_FIELDS[0]].isdigit()]
+    tables = [table_row(row["Firm name"], *(row[field] for field in GPT_FIELDS)) for row in scored]
+    refusals = [row[GPT_FIELDS[1]] for row in rows if not row[GPT_FIELDS[0]].isdigit()]
+    # Long free-text answers, the worst case for the fallback path
+    prose = ["\n".join([f"**Analysis of {row['Firm name']}**", "", row[GPT_FIELDS[1]], "",
+                        row[GPT_FIELDS[2]], "", f"Score: {row[GPT_FIELDS[0]]}", "", row[GPT_FIELDS[3]]])
+             for row in scored]
+    batch = [dict(row, Nr=str(index)) for index, row in enumerate(scored[:BATCH_SIZE], 1)]
+    batch_response = "\n".join(
+        table_row(row["Nr"], row["Firm name"], *(row[field] for field in GPT_FIELDS)) for row in batch
+    )
+
+    return [
+        ("table row", time_per_call(parse_analysis_with_path, tables, iterations)),
+        ("refusal", time_per_call(parse_analysis_with_path, refusals, iterations)),
+        ("free-text fallback", time_per_call(parse_analysis_with_path, prose, iterations)),
+        (f"batch split ({BATCH_SIZE} firms)",
+         time_per_call(lambda response: split_batch_response(response, batch), [batch_response], iterations)),
+        ("streamed table row", time_per_call(stream_text, tables, iterations)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden checks and timings for the response parser.")
+    parser.add_argument("--iterations", type=int, default=5000, help="Parses timed per response kind")
+    parser.add_argument("--skip-golden", action="store_true")
+    parser.add_argument("--skip-timing", action="store_true")
+    args = parser.parse_args()
+
+    rows = load_golden_rows()
+    if not args.skip_golden:
+        checked, failures = run_golden(rows)
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            print(f"❌ {len(failures)} golden mismatches in {checked} cases")
+            sys.exit(1)
+        print(f"✅ {checked} golden cases parse as recorded")
+
+    if not args.skip_timing:
+        for label, microseconds in run_microbenchmark(rows, args.iterations):
+            print(f"  {label:<22} {microseconds:8.1f} µs per response")
+
+
+if __name__ == "__main__":
+    main()
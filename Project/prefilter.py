@@ -0,0 +1,92 @@
+import re
+import threading
+
+# Mirrors the mechanical sector and location rules in FDI_PROMPT_TEMPLATE so
+# firms that are certain to score 0 never reach the API.
+SECTOR_TERMS = [
+    "Energy", "Marine", "Maritime", "Alternative Energy", "Energy Infrastructure",
+    "Energy Storage", "Energy Production", "Oil and Gas"
+]
+KEYWORD_TERMS = [
+    "maritime", "shipping", "marine", "port", "vessel", "hydrogen", "fuel cell",
+    "energy storage", "renewable energy", "solar", "wind", "battery", "batteries"
+]
+SUMMARY_TERMS = [
+    "maritime", "shipping", "marine", "port", "vessel", "hydrogen", "fuel cell",
+    "energy storage", "renewable energy"
+]
+# Columns the sector rule is judged on; a row with none of them filled gives no evidence either way
+SECTOR_COLUMNS = ["Primary Industry Sector", "All Industries", "Keywords", "Company Summary"]
+NETHERLANDS_NAMES = {"netherlands", "the netherlands", "nederland", "holland"}
+
+NOT_IN_SECTOR = "Not in Energy/Maritime sector"
+ALREADY_IN_NETHERLANDS = "Already in Netherlands"
+
+
+def _compile_terms(terms):
+    # Terms are matched anywhere, as the prompt's "contains" rules say: "seaport"
+    # contains "port". A wrong match only sends a row to the model, never scores it 0.
+    alternation = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(alternation, re.IGNORECASE)
+
+
+_SECTOR_RE = _compile_terms(SECTOR_TERMS)
+_KEYWORD_RE = _compile_terms(KEYWORD_TERMS)
+_SUMMARY_RE = _compile_terms(SUMMARY_TERMS)
+
+
+def has_sector_data(row):
+    return any((row.get(column) or "").strip() for column in SECTOR_COLUMNS)
+
+
+def prefilter_reason(row):
+    """Return the score-0 explanation for a row, or None if it needs the LLM.
+
+    Rows without any sector data are never rejected on sector; the model
+    decides (or flags them as failed for missing data).
+    """
+    if has_sector_data(row) and not (_SECTOR_RE.search(row.get("Primary Industry Sector") or "")
+            or _SECTOR_RE.search(row.get("All Industries") or "")
+            or _KEYWORD_RE.search(row.get("Keywords") or "")
+            or _SUMMARY_RE.search(row.get("Company Summary") or "")):
+        return NOT_IN_SECTOR
+    if (row.get("Country") or "").strip().lower() in NETHERLANDS_NAMES:
+        return ALREADY_IN_NETHERLANDS
+    return None
+
+
+def prefilter_response(row, reason):
+    """Build the same markdown row the model is asked to return for a score of 0."""
+    firm_name = (row.get("Firm name") or "").replace("|", "/")
+    return f"| {firm_name} | 0 | {reason} |  |  |"
+
+
+class SectorPrefilter:
+    """Thread-safe wrapper around prefilter_reason that counts the calls it saves."""
+
+    def __init__(self):
+        self.checked = 0
+        self.skipped = {NOT_IN_SECTOR: 0, ALREADY_IN_NETHERLANDS: 0}
+        self.no_sector_data = 0
+        self._lock = threading.Lock()
+
+    def check(self, row):
+        reason = prefilter_reason(row)
+        with self._lock:
+            self.checked += 1
+            if reason is None and not has_sector_data(row):
+                self.no_sector_data += 1
+            if reason is not None:
+                self.skipped[reason] += 1
+        if reason is None:
+            return None
+        return prefilter_response(row, reason)
+
+    def summary(self):
+        saved = sum(self.skipped.values())
+        return (
+            f"Pre-filter: {saved} of {self.checked} rows scored locally, {saved} API calls saved "
+            f"({self.skipped[NOT_IN_SECTOR]} not in sector, "
+            f"{self.skipped[ALREADY_IN_NETHERLANDS]} already in Netherlands); "
+            f"{self.no_sector_data} rows without sector data sent to the model"
+        )
@@ -0,0 +1,68 @@
+import operator
+import string
+
+
+class PromptTemplate:
+    """Dependency-free stand-in for the f-string templates of langchain_core.
+
+    The template is split into literal text and placeholders once, when it is
+    created, so malformed or unsupported placeholders fail at import time.
+    Rendering is a single %-format of the precompiled text; `{{` and `}}`
+    are literal braces as in str.format.
+    """
+
+    def __init__(self, template):
+        parts = []
+        fields = []
+        # Escaped braces come back as extra literal chunks without a field, so a
+        # slot is only added where a placeholder actually follows the literal
+        for literal, field, format_spec, conversion in string.Formatter().parse(template):
+            parts.append(literal.replace("%", "%%"))
+            if field is None:
+                continue
+            if not field.isidentifier() or format_spec or conversion:
+                raise ValueError(f"Unsupported placeholder {{{field}}} in prompt template; "
+                                 f"only plain names such as {{firm_name}} are allowed")
+            parts.append("%s")
+            fields.append(field)
+        self.template = template
+        self.fields = tuple(fields)
+        self.input_variables = sorted(set(fields))
+        self._format = "".join(parts)
+        # Checked once per template: rendering must agree with str.format
+        sample = {field: f"<{field}>" for field in self.input_variables}
+        if self.format(**sample) != template.format(**sample):
+            raise ValueError("Prompt template renders differently from str.format")
+
+    @classmethod
+    def from_template(cls, template):
+        return cls(template)
+
+    def format(self, **values):
+        missing = [field for field in self.input_variables if field not in values]
+        if missing:
+            raise KeyError(f"Missing prompt values: {', '.join(missing)}")
+        return self._format % tuple(values[field] for field in self.fields)
+
+    def row_renderer(self, columns):
+        """Precompiled row -> prompt function for a placeholder -> input column mapping.
+
+        Every placeholder must have a column, which is checked here rather than
+        per row. Rows missing a column render it as an empty string.
+        """
+        unmapped = [field for field in self.input_variables if field not in columns]
+        if unmapped:
+            raise ValueError(f"No input column for prompt placeholders: {', '.join(unmapped)}")
+        row_columns = [columns[field] for field in self.fields]
+        getter = operator.itemgetter(*row_columns) if len(row_columns) > 1 else None
+        template = self._format
+
+        def render(row):
+            if getter is None:
+                return template % tuple(row.get(column, '') for column in row_columns)
+            try:
+                return template % getter(row)
+            except KeyError:
+                return template % tuple(row.get(column, '') for column in row_columns)
+
+        return render
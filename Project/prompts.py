@@ -1,6 +1,6 @@
-from langchain_core.prompts import PromptTemplate
+from prompt_template import PromptTemplate
 
-FDI_PROMPT_TEMPLATE = """
+_ROLE_AND_DATA_INPUT = """
 SYSTEM ROLE:
 You are the "FDI Business Analyst for Energy and Maritime sector for the Netherlands."
 
@@ -10,9 +10,10 @@ Determine which trade fair participants from the provided table have a good chan
 DATA INPUT:
 CSV file containing rows of company information per firm, such as firm name, company website, booth number, country, company summary, and additional financial or strategic indicators.
 
-Here is the specific input for this firm:
+"""
 
-Firm Name: {firm_name}  
+# Per-firm input fields, shared by the single-firm and the batched prompt
+FIRM_INPUT_TEMPLATE = """Firm Name: {firm_name}  
 Company Website: {company_website}  
 LinkedIn URL: {linkedin_url}  
 Booth nr: {boothnr}  
@@ -30,9 +31,9 @@ Net Income: {net_income}
 Ownership Status: {ownership_status}  
 Company Financing Status: {financing_status}  
 Active Investors: {active_investors}  
-Company Summary: {summary}
+Company Summary: {summary}"""
 
-INSTRUCTIONS:
+_INSTRUCTIONS = """INSTRUCTIONS:
 1. Analyze companies that are ONLY from the Energy or Maritime sectors as mentioned in the SYSTEM ROLE. For companies that are clearly in other sectors (like Business Products and Services, Manufacturing, Information Technology, etc.), leave ALL information blank and skip analysis.
 2. To determine if a company is Energy/Maritime sector, check these criteria in order:
    a) Primary Industry Sector contains: "Energy", "Marine", "Maritime", "Alternative Energy", "Energy Infrastructure", "Energy Storage", "Energy Production", "Oil and Gas"
@@ -115,7 +116,9 @@ INSTRUCTIONS:
         d. Sources: LinkedIn, PortXL, accelerator websites, news about STAR
 
 
-OUTPUT:
+"""
+
+_OUTPUT_FORMAT = """OUTPUT:
 You MUST return **exactly one row** in a Markdown table format using this exact structure:
 
 | Firm Name | Score  | Score Explanation | Dutch Ecosystem Fit & Chain Partners | Sources Details |
@@ -126,7 +129,9 @@ CRITICAL REQUIREMENTS:
 - Return ONLY the data row with pipe symbols (|)
 - Do NOT include any text before or after the table
 - Do NOT include the header row
-- If the company is already in Netherlands, use score 0 and write "Already in Netherlands" in the explanation column
+"""
+
+_OUTPUT_REQUIREMENTS = """- If the company is already in Netherlands, use score 0 and write "Already in Netherlands" in the explanation column
 - If the company is NOT in Energy/Maritime sector, use score 0 and write "Not in Energy/Maritime sector" in the explanation column
 - Provide a specific score between 0-100 based on your analysis
 - Give detailed explanations for your scoring and Dutch market fit assessment
@@ -138,11 +143,61 @@ CRITICAL REQUIREMENTS:
 - DO NOT include information mentioned in other sources in the same analysis
 - If a source doesn't provide specific, quantifiable evidence for outreach decision, DO NOT include it in Sources Details
 - Only include sources where you found specific, actionable information
+"""
 
+_EXAMPLE_OUTPUT = """
 EXAMPLE OUTPUT:
 | Fortescue | 75 | Strong energy sector presence with innovative solutions. Company shows EU expansion interest and has relevant technology for Dutch energy transition. | Good fit with Dutch energy ecosystem. Potential partnerships with Port of Rotterdam and Dutch energy companies. | LinkedIn: CEO announced €20M investment for European expansion, specifically mentions Rotterdam port opportunities. \n News: €50M funding round for European expansion, partnership with Dutch energy company announced. \n Patent Database: 5 patents filed in EU for hydrogen storage technology, 2 specifically for maritime applications. \n Project Databases: Lead partner in Horizon Europe H2Maritime project (€12M budget). |
 
 END OUTPUT
 """
 
+FDI_PROMPT_TEMPLATE = (
+    _ROLE_AND_DATA_INPUT
+    + "Here is the specific input for this firm:\n\n"
+    + FIRM_INPUT_TEMPLATE
+    + "\n\n"
+    + _INSTRUCTIONS
+    + _OUTPUT_FORMAT
+    + _OUTPUT_REQUIREMENTS
+    + _EXAMPLE_OUTPUT
+)
+
+_BATCH_OUTPUT_FORMAT = """OUTPUT:
+You MUST return **exactly one row per firm** in a Markdown table format, in the same order as the input, using this exact structure:
+
+| Nr | Firm Name | Score  | Score Explanation | Dutch Ecosystem Fit & Chain Partners | Sources Details |
+|----|-----------|---------------|--------------------------------------|----------------------------------------------------------|----------------|
+| [Nr] | [Company Name] | [Number 0-100] | [Your explanation] | [Dutch ecosystem analysis] | [Sources used: LinkedIn: [info], \n Website: [info], \n  News: [info]] |
+
+CRITICAL REQUIREMENTS:
+- Return ONLY the data rows with pipe symbols (|), one row per firm
+- Start every row with the firm's Nr exactly as given in the input
+- Analyze and score every firm independently; never merge firms into one row or skip a firm
+- Do NOT include any text before or after the table
+- Do NOT include the header row
+"""
+
+_BATCH_EXAMPLE_OUTPUT = """
+EXAMPLE OUTPUT:
+| 1 | Fortescue | 75 | Strong energy sector presence with innovative solutions. Company shows EU expansion interest and has relevant technology for Dutch energy transition. | Good fit with Dutch energy ecosystem. Potential partnerships with Port of Rotterdam and Dutch energy companies. | LinkedIn: CEO announced €20M investment for European expansion, specifically mentions Rotterdam port opportunities. |
+| 2 | Example Software GmbH | 0 | Not in Energy/Maritime sector |  |  |
+
+END OUTPUT
+"""
+
+# Analyzes several firms in one request so the instruction block is sent once
+FDI_BATCH_PROMPT_TEMPLATE = (
+    _ROLE_AND_DATA_INPUT
+    + "Here is the specific input for each firm. Every firm starts with its Nr:\n\n"
+    + "{firms}"
+    + "\n\n"
+    + _INSTRUCTIONS
+    + _BATCH_OUTPUT_FORMAT
+    + _OUTPUT_REQUIREMENTS
+    + _BATCH_EXAMPLE_OUTPUT
+)
+
 FDI_RANKING_PROMPT = PromptTemplate.from_template(FDI_PROMPT_TEMPLATE)
+FDI_BATCH_RANKING_PROMPT = PromptTemplate.from_template(FDI_BATCH_PROMPT_TEMPLATE)
+FIRM_INPUT_PROMPT = PromptTemplate.from_template("Nr: {nr}  \n" + FIRM_INPUT_TEMPLATE)
@@ -1,80 +1,296 @@
-import csv
-import openai
 import os
-from dotenv import load_dotenv
-from prompts import FDI_RANKING_PROMPT
+import random
+import threading
+import time
+from cache import cache_key
+from prompts import FDI_BATCH_RANKING_PROMPT, FDI_RANKING_PROMPT, FIRM_INPUT_PROMPT
+from response_parser import ResponseStream, parse_analysis, split_batch_response
 
+# Prompt placeholder -> input column
+PROMPT_COLUMNS = {
+    'firm_name': 'Firm name',
+    'company_website': 'Company Website',
+    'linkedin_url': 'LinkedIn URL',
+    'boothnr': 'Booth nr',
+    'country': 'Country',
+    'hq_city': 'HQ City',
+    'primary_sector': 'Primary Industry Sector',
+    'vertical': 'Vertical',
+    'all_industries': 'All Industries',
+    'employee_count': 'Employees',
+    'year_founded': 'Year Founded',
+    'keywords': 'Keywords',
+    'revenue': 'Revenue',
+    'gross_profit': 'Gross Profit',
+    'net_income': 'Net Income',
+    'ownership_status': 'Ownership Status',
+    'financing_status': 'Company Financing Status',
+    'active_investors': 'Active Investors',
+    'summary': 'Company Summary'
+}
+# Precompiled row -> prompt renderers; a placeholder without a column fails at import
+_render_firm_prompt = FDI_RANKING_PROMPT.row_renderer(PROMPT_COLUMNS)
+_render_firm_input = FIRM_INPUT_PROMPT.row_renderer({'nr': 'Nr', **PROMPT_COLUMNS})
 
-def read_csv(file_path):
-    with open(file_path, newline='', encoding='utf-8-sig') as file:
-        return list(csv.DictReader(file))
+# Output columns filled from the model's response
+GPT_FIELDS = [
+    "GPT Score",
+    "GPT Score Explanation",
+    "GPT Dutch Ecosystem Fit & Chain Partners",
+    "GPT Sources Details"
+]
 
+MODEL = "gpt-4"
+TEMPERATURE = 0.4
+SYSTEM_MESSAGE = "You are a helpful AI FDI analyst."
+MAX_RETRIES = 5
+DEFAULT_TIMEOUT_SECONDS = 120.0
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
 
-def get_company_analysis(row_data):
-    # Try multiple ways to get the API key
-    api_key = None
-    
-    # Method 1: Try to load from .env file in the same directory as this script
+
+def _retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _backoff_delay(attempt, retry_after=None):
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, BACKOFF_BASE_SECONDS))
+    return delay
+
+
+def load_api_key():
+    # Prefer a .env file next to this script, then the process environment
     try:
+        from dotenv import load_dotenv
+
         script_dir = os.path.dirname(os.path.abspath(__file__))
         env_path = os.path.join(script_dir, '.env')
         if os.path.exists(env_path):
             load_dotenv(env_path)
-            api_key = os.getenv('OPENAI_API_KEY')
     except Exception as e:
         print(f"⚠️ Warning: Could not load .env file: {e}")
-    
-    # Method 2: Try to get from system environment variables
-    if not api_key:
-        api_key = os.getenv('OPENAI_API_KEY')
-    
-    # Method 3: Fallback to hardcoded key (not recommended for production)
+
+    api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         print("⚠️ Warning: No API key found. Please set OPENAI_API_KEY environment variable or check your .env file.")
         raise ValueError("No OpenAI API key found. Please set OPENAI_API_KEY environment variable or check your .env file.")
-    
-    if not api_key:
-        raise ValueError("No OpenAI API key found. Please set OPENAI_API_KEY environment variable or check your .env file.")
-    
-    prompt = FDI_RANKING_PROMPT.format(
-        firm_name=row_data.get('Firm name', ''),
-        company_website=row_data.get('Company Website', ''),
-        linkedin_url=row_data.get('LinkedIn URL', ''),
-        boothnr=row_data.get('Booth nr', ''),
-        country=row_data.get('Country', ''),
-        hq_city=row_data.get('HQ City', ''),
-        primary_sector=row_data.get('Primary Industry Sector', ''),
-        vertical=row_data.get('Vertical', ''),
-        all_industries=row_data.get('All Industries', ''),
-        employee_count=row_data.get('Employees', ''),
-        year_founded=row_data.get('Year Founded', ''),
-        keywords=row_data.get('Keywords', ''),
-        revenue=row_data.get('Revenue', ''),
-        gross_profit=row_data.get('Gross Profit', ''),
-        net_income=row_data.get('Net Income', ''),
-        ownership_status=row_data.get('Ownership Status', ''),
-        financing_status=row_data.get('Company Financing Status', ''),
-        active_investors=row_data.get('Active Investors', ''),
-        summary=row_data.get('Company Summary', '')
-    )
-
-    # Get API key from environment variable
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables. Please check your .env file.")
-    
-    client = openai.OpenAI(api_key=api_key)
+    return api_key
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI FDI analyst."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.4
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"❌ OpenAI API error for {row_data.get('Firm name', '')}: {e}")
+
+def is_scored(content, nrs=None):
+    """True if a completion yields a score for its firm, or for every firm of a batch."""
+    if nrs is None:
+        return parse_analysis(content)[0] != "N/A"
+    responses = split_batch_response(content, [{"Nr": nr} for nr in nrs])
+    return len(responses) == len(nrs) and all(is_scored(response) for response in responses.values())
+
+
+def build_company_messages(row_data):
+    return _build_messages(_render_firm_prompt(row_data))
+
+
+class CompanyAnalyzer:
+    """Scores firms through one long-lived, connection-pooled OpenAI client.
+
+    Configuration is read once and the client is created on the first request
+    that misses the cache, so fully cached runs need no API key. Retries are
+    handled here rather than in the client so rate limits can feed back into
+    the shared limiter.
+
+    With stream=True completions are streamed and the connection is closed as
+    soon as the table rows are complete, which skips any trailing commentary.
+    """
+
+    def __init__(self, model=MODEL, temperature=TEMPERATURE, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 max_retries=MAX_RETRIES, limiter=None, cache=None, api_key=None, base_url=None,
+                 stream=False):
+        self.model = model
+        self.temperature = temperature
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter
+        self.cache = cache
+        self.stream = stream
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # Imported on first use: openai is slow to import and cached runs never need it
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=self._api_key or load_api_key(),
+                        base_url=self._base_url,
+                        timeout=self.timeout,
+                        max_retries=0
+                    )
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    def analyze(self, row_data, metrics=None):
+        prompt = _render_firm_prompt(row_data)
+        return self.complete(prompt, row_data.get('Firm name', ''), metrics)
+
+    def cached_analysis(self, row_data):
+        """The cached single-firm completion for a row, or None; for the Batch API path."""
+        if self.cache is None:
+            return None
+        return self.cache.get(cache_key(self.model, self.temperature, build_company_messages(row_data)),
+                              accept=is_scored)
+
+    def store_analysis(self, row_data, content):
+        """Cache a single-firm completion obtained outside complete(), e.g. from a batch job."""
+        if self.cache is not None and is_scored(content):
+            self.cache.put(cache_key(self.model, self.temperature, build_company_messages(row_data)),
+                           self.model, content)
+
+    def analyze_batch(self, rows, metrics=None):
+        """Analyze several firms in one request; returns the raw multi-row response."""
+        firms = "\n\n".join(_render_firm_input(row) for row in rows)
+        prompt = FDI_BATCH_RANKING_PROMPT.format(firms=firms)
+        label = f"batch of {len(rows)} firms (Nr {rows[0].get('Nr', '')}-{rows[-1].get('Nr', '')})"
+        return self.complete(prompt, label, metrics, nrs=[row.get('Nr', '') for row in rows])
+
+    def complete(self, prompt, label, metrics=None, nrs=None):
+        """Return the completion text, or "API_ERROR" once retries are exhausted.
+
+        If a metrics dict is given it is filled with the model, whether the cache
+        answered, the number of requests and retries, the time spent in requests
+        and the token usage reported by the API (not reported for streams that
+        were stopped early). `nrs` lists the firms of a batched prompt, so a
+        stream knows when every row has arrived.
+        """
+        if metrics is None:
+            metrics = {}
+        metrics.update(model=self.model, cached=False, requests=0, retries=0,
+                       latency_s=0.0, prompt_tokens=0, completion_tokens=0)
+        messages = _build_messages(prompt)
+        key = None
+        if self.cache is not None:
+            key = cache_key(self.model, self.temperature, messages)
+            # Entries stored before unscored completions were kept out of the cache are misses too
+            cached = self.cache.get(key, accept=lambda completion: is_scored(completion, nrs))
+            if cached is not None:
+                metrics["cached"] = True
+                return cached
+
+        import openai  # for the exception types below; loaded once the cache misses
+
+        # Created outside the retry loop so a missing API key fails the run loudly
+        client = self.client
+        limiter = self.limiter
+        for attempt in range(self.max_retries + 1):
+            metrics["requests"] += 1
+            metrics["retries"] = attempt
+            start = time.monotonic()
+            response_stream = ResponseStream(nrs) if self.stream else None
+            try:
+                if limiter is not None:
+                    with limiter.slot():
+                        start = time.monotonic()
+                        content, usage = self._create_completion(client, messages, response_stream)
+                    limiter.on_success()
+                else:
+                    content, usage = self._create_completion(client, messages, response_stream)
+                metrics["latency_s"] += time.monotonic() - start
+                if usage is not None:
+                    metrics["prompt_tokens"] = usage.prompt_tokens
+                    metrics["completion_tokens"] = usage.completion_tokens
+                content = content.strip()
+                # An unscored completion is not cached, so --retry-failed asks the model again
+                if self.cache is not None and is_scored(content, nrs):
+                    self.cache.put(key, self.model, content)
+                return content
+            except openai.RateLimitError as e:
+                metrics["latency_s"] += time.monotonic() - start
+                if getattr(e, "code", None) == "insufficient_quota":
+                    print(f"❌ OpenAI API error for {label}: {e}")
+                    return "API_ERROR"
+                if limiter is not None:
+                    limiter.on_throttle()
+                error = e
+                delay = _backoff_delay(attempt, _retry_after_seconds(e))
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                metrics["latency_s"] += time.monotonic() - start
+                error = e
+                delay = _backoff_delay(attempt)
+            except Exception as e:
+                print(f"❌ OpenAI API error for {label}: {e}")
+                return "API_ERROR"
+
+            if attempt < self.max_retries:
+                print(f"⏳ Retrying {label} in {delay:.1f}s ({type(error).__name__})")
+                time.sleep(delay)
+
+        print(f"❌ OpenAI API error for {label} after {self.max_retries + 1} attempts: {error}")
         return "API_ERROR"
+
+    def _create_completion(self, client, messages, response_stream=None):
+        """Return (content, usage) of one chat completion request."""
+        if response_stream is None:
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature
+            )
+            return response.choices[0].message.content, response.usage
+
+        usage = None
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        with stream:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    # Leaving the block closes the connection; the rest can't change the parsed row
+                    if response_stream.feed(chunk.choices[0].delta.content):
+                        break
+        return response_stream.text, usage
+
+
+_default_analyzer = None
+_default_analyzer_lock = threading.Lock()
+
+
+def get_company_analysis(row_data):
+    global _default_analyzer
+    if _default_analyzer is None:
+        with _default_analyzer_lock:
+            if _default_analyzer is None:
+                _default_analyzer = CompanyAnalyzer()
+    return _default_analyzer.analyze(row_data)
+
+
+def _build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
@@ -0,0 +1,210 @@
+import re
+
+# Fallback score patterns, tried in this order on each lowercased line
+SCORE_PATTERNS = [
+    re.compile(r'score[:\s]*(\d{1,3})'),
+    re.compile(r'rating[:\s]*(\d{1,3})'),
+    re.compile(r'(\d{1,3})/100'),
+    re.compile(r'(\d{1,3})\s*out\s*of\s*100'),
+    re.compile(r'assessment[:\s]*(\d{1,3})')
+]
+# Matches every line any score pattern could match, so most lines skip the patterns entirely
+_SCORE_HINT_RE = re.compile(r'score|rating|/100|out\s*of\s*100|assessment')
+
+DUTCH_TERMS = ['dutch', 'netherlands', 'amsterdam', 'rotterdam', 'eindhoven']
+SOURCE_TERMS = [
+    'linkedin', 'website', 'news', 'source', 'patent', 'trade', 'industry', 'regulatory', 'publication',
+    'database', 'project', 'accelerator', 'portxl', 'buccaneer', 'horizon', 'interreg', 'emsa', 'imo'
+]
+_DUTCH_RE = re.compile("|".join(map(re.escape, DUTCH_TERMS)))
+_SOURCE_RE = re.compile("|".join(map(re.escape, SOURCE_TERMS)))
+
+MAX_WORDS = 100
+MAX_MEANINGFUL_LINES = 3
+MAX_DUTCH_MENTIONS = 2
+MAX_SOURCE_MENTIONS = 4
+MAX_SOURCES_CHARS = 250
+
+
+def parse_markdown_row(markdown_row):
+    parts = markdown_row.strip().strip("|").split("|")
+    return [part.strip() for part in parts]
+
+
+def _table_cells(line, stripped):
+    if stripped.startswith('|') and len(line.split('|')) >= 5:
+        parsed = parse_markdown_row(line)
+        if len(parsed) >= 5:
+            return parsed
+    return None
+
+
+def _line_score(lowered):
+    for pattern in SCORE_PATTERNS:
+        match = pattern.search(lowered)
+        if match:
+            score_val = int(match.group(1))
+            if 0 <= score_val <= 100:
+                return str(score_val)
+    return None
+
+
+def _truncate_words(text):
+    words = text.split()
+    if len(words) > MAX_WORDS:
+        return ' '.join(words[:MAX_WORDS]) + "..."
+    return text
+
+
+def parse_analysis(markdown_row):
+    return parse_analysis_with_path(markdown_row)[0]
+
+
+def parse_analysis_with_path(markdown_row):
+    """Parse a response into the four GPT fields in one pass over its lines.
+
+    The first pipe-table row wins. Without one (or if its score is N/A) the
+    fields are pieced together from the free text: the first 0-100 score, the
+    first meaningful lines, lines mentioning the Netherlands and lines naming
+    sources. Also returns which path produced them: "table", "fallback", or
+    "failed" when no score could be found.
+    """
+    table = None
+    score = None
+    meaningful_lines = []
+    dutch_mentions = []
+    sources_mentions = []
+
+    for line in markdown_row.split('\n'):
+        stripped = line.strip()
+        if table is None:
+            table = _table_cells(line, stripped)
+            if table is not None and table[1] != "N/A":
+                return tuple(table[1:5]), "table"
+        lowered = line.lower()
+        if score is None and _SCORE_HINT_RE.search(lowered):
+            score = _line_score(lowered)
+        if (len(meaningful_lines) < MAX_MEANINGFUL_LINES and len(stripped) > 20
+                and not stripped.startswith('|') and not stripped.startswith('ANALYSIS:')):
+            meaningful_lines.append(stripped)
+        if len(dutch_mentions) < MAX_DUTCH_MENTIONS and _DUTCH_RE.search(lowered):
+            dutch_mentions.append(stripped)
+        if len(sources_mentions) < MAX_SOURCE_MENTIONS and _SOURCE_RE.search(lowered):
+            sources_mentions.append(stripped)
+
+    explanation, ecosystem_fit, sources_details = table[2:5] if table is not None else ("", "", "")
+    if meaningful_lines:
+        explanation = _truncate_words(' '.join(meaningful_lines))
+    if dutch_mentions:
+        ecosystem_fit = _truncate_words(' '.join(dutch_mentions))
+    else:
+        ecosystem_fit = "No specific Dutch market mention found"
+    # A table row with an N/A score keeps its own sources column
+    if not sources_details:
+        if sources_mentions:
+            sources_details = ' '.join(sources_mentions)
+            if len(sources_details) > MAX_SOURCES_CHARS:
+                sources_details = sources_details[:MAX_SOURCES_CHARS] + "..."
+        else:
+            sources_details = "No specific sources mentioned"
+
+    score = score or "N/A"
+    return (score, explanation, ecosystem_fit, sources_details), ("fallback" if score != "N/A" else "failed")
+
+
+def split_batch_response(response, rows):
+    """Map the rows of a batched response back to their firms.
+
+    Rows are matched by Nr, or by firm name if the model mangled the Nr. Returns
+    {Nr: single-firm markdown row}; firms the model dropped or merged are absent.
+    """
+    nrs = {row["Nr"] for row in rows}
+    nr_by_name = {(row.get("Firm name") or "").strip().lower(): row["Nr"] for row in rows}
+    responses = {}
+    for line in response.split('\n'):
+        if not line.strip().startswith('|'):
+            continue
+        parsed = parse_markdown_row(line)
+        if len(parsed) < 6:
+            continue
+        nr = parsed[0] if parsed[0] in nrs else nr_by_name.get(parsed[1].lower())
+        if nr is None or nr in responses:
+            continue
+        responses[nr] = "| " + " | ".join(parsed[1:6]) + " |"
+    return responses
+
+
+def _closed_cells(line, count):
+    """Cells of a still-growing table line, or None until its first `count` cells are final.
+
+    A cell is final once a pipe follows it; the last one must also be non-empty,
+    because trailing pipes after an empty cell are stripped from a finished row.
+    """
+    stripped = line.lstrip()
+    if not stripped.startswith('|'):
+        return None
+    cells = stripped.lstrip('|').split('|')
+    if len(cells) <= count or not cells[count - 1].strip():
+        return None
+    return [cell.strip() for cell in cells[:count]]
+
+
+class ResponseStream:
+    """Incremental parser for a streamed completion.
+
+    feed() takes text deltas and returns True as soon as the rest of the
+    response can no longer change the parsed result: for a single firm, when
+    its table row has a score and all five cells; for a batch (`nrs` given),
+    when every firm's row has all six cells. The text received so far, in
+    `text`, then parses exactly like the full response would.
+    """
+
+    def __init__(self, nrs=None):
+        self.nrs = set(nrs) if nrs is not None else None
+        self.done = False
+        self._na_table = False
+        self._chunks = []
+        self._line = ""
+        self._seen_nrs = set()
+
+    @property
+    def text(self):
+        return "".join(self._chunks)
+
+    def feed(self, delta):
+        if self.done or not delta:
+            return self.done
+        self._chunks.append(delta)
+        if '\n' in delta:
+            *complete, self._line = (self._line + delta).split('\n')
+            for line in complete:
+                if self._check_line(line, complete=True):
+                    self.done = True
+                    return True
+        else:
+            self._line += delta
+            # Cells only close on a pipe, so other deltas cannot complete a row
+            if '|' not in delta:
+                return False
+        self.done = self._check_line(self._line, complete=False)
+        return self.done
+
+    def _check_line(self, line, complete):
+        if self.nrs is None:
+            # Only the first table row counts; an N/A score there sends parsing to the free text
+            if self._na_table:
+                return False
+            if complete:
+                cells = _table_cells(line, line.strip())
+            else:
+                cells = _closed_cells(line, 5)
+            if cells is None:
+                return False
+            if cells[1] == "N/A":
+                self._na_table = complete
+                return False
+            return True
+        cells = parse_markdown_row(line) if complete and line.strip().startswith('|') else _closed_cells(line, 6)
+        if cells is not None and len(cells) >= 6 and cells[0] in self.nrs:
+            self._seen_nrs.add(cells[0])
+        return self._seen_nrs >= self.nrs
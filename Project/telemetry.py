@@ -0,0 +1,138 @@
+import csv
+import json
+import math
+import threading
+import time
+
+# USD per 1K tokens (prompt, completion); used only for the run estimate
+MODEL_PRICES_PER_1K = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+METRIC_FIELDS = [
+    "nr", "firm", "source", "tier", "model", "batch_size", "cached", "requests", "retries",
+    "latency_s", "prompt_tokens", "completion_tokens", "parse_path", "status"
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES_PER_1K.get(model)
+    if prices is None:
+        # Dated snapshots such as "gpt-4o-2024-08-06" are priced like their family
+        family = max((name for name in MODEL_PRICES_PER_1K if model and model.startswith(name)), key=len, default=None)
+        prices = MODEL_PRICES_PER_1K.get(family)
+    if prices is None:
+        return None
+    return prompt_tokens / 1000 * prices[0] + completion_tokens / 1000 * prices[1]
+
+
+class RunTelemetry:
+    """Writes one metrics record per processed row and aggregates a run report.
+
+    The sidecar is JSONL, or CSV when the path ends in .csv. With append=True
+    (resumed runs) records are added to an existing sidecar instead of
+    replacing it; the report still covers this invocation only.
+
+    A row recorded twice (a batch-job failure retried interactively) counts
+    once in the row, source and parse figures, by its last record; requests,
+    retries and tokens of both attempts are kept since both were paid for.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.started = time.monotonic()
+        self.rows = 0
+        self.sources = {}
+        self.latencies = []
+        self.tokens = {}
+        self.retries = 0
+        self.parsed = 0
+        self.fallback_parses = 0
+        self.failed_parses = 0
+        # Nr -> (source, parse_path) of its last record
+        self._outcomes = {}
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if append else "w", newline='', encoding="utf-8")
+        self._csv = None
+        if path.lower().endswith(".csv"):
+            self._csv = csv.DictWriter(self._file, fieldnames=METRIC_FIELDS, extrasaction="ignore")
+            if self._file.tell() == 0:
+                self._csv.writeheader()
+
+    def record(self, metrics):
+        record = {field: metrics.get(field) for field in METRIC_FIELDS}
+        if record["latency_s"] is not None:
+            record["latency_s"] = round(record["latency_s"], 4)
+        with self._lock:
+            if self._csv is not None:
+                self._csv.writerow(record)
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            source = record["source"]
+            previous = self._outcomes.get(record["nr"])
+            if previous is None:
+                self.rows += 1
+            else:
+                self._count_outcome(*previous, -1)
+            self._outcomes[record["nr"]] = (source, record["parse_path"])
+            self._count_outcome(source, record["parse_path"], 1)
+            if record["requests"]:
+                self.latencies.append(record["latency_s"] or 0.0)
+                self.retries += record["retries"] or 0
+            # A cascaded row used two models; its usage is split per model for pricing
+            usage = metrics.get("tokens_by_model")
+            if usage is None and record["model"]:
+                usage = {record["model"]: (record["prompt_tokens"] or 0, record["completion_tokens"] or 0)}
+            for model, (prompt_tokens, completion_tokens) in (usage or {}).items():
+                prompt, completion = self.tokens.get(model, (0, 0))
+                self.tokens[model] = (prompt + prompt_tokens, completion + completion_tokens)
+
+    def _count_outcome(self, source, parse_path, step):
+        self.sources[source] = self.sources.get(source, 0) + step
+        # Parse quality is only meaningful for model output
+        if source in ("model", "cache", "batch_job"):
+            self.parsed += step
+            if parse_path == "fallback":
+                self.fallback_parses += step
+            elif parse_path == "failed":
+                self.failed_parses += step
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        throughput = self.rows / elapsed * 60 if elapsed > 0 else 0.0
+        prompt_tokens = sum(prompt for prompt, _ in self.tokens.values())
+        completion_tokens = sum(completion for _, completion in self.tokens.values())
+        costs = [estimate_cost(model, *usage) for model, usage in self.tokens.items()]
+        cost = sum(c for c in costs if c is not None)
+        unpriced = [model for model, c in zip(self.tokens, costs) if c is None]
+        fallback_rate = 100.0 * self.fallback_parses / self.parsed if self.parsed else 0.0
+        failed_rate = 100.0 * self.failed_parses / self.parsed if self.parsed else 0.0
+        sources = ", ".join(f"{count} {source}" for source, count in sorted(self.sources.items()) if count)
+
+        lines = [
+            f"Run report ({self.path}):",
+            f"  rows: {self.rows} in {elapsed:.1f}s ({throughput:.1f} rows/min) - {sources}",
+            f"  request latency: p50 {percentile(latencies, 0.50):.2f}s, p95 {percentile(latencies, 0.95):.2f}s, "
+            f"p99 {percentile(latencies, 0.99):.2f}s over {len(latencies)} rows, {self.retries} retries",
+            f"  tokens: {prompt_tokens} prompt + {completion_tokens} completion, "
+            f"estimated cost ${cost:.2f}" + (f" (no price for {', '.join(unpriced)})" if unpriced else ""),
+            f"  parsing: {fallback_rate:.1f}% fallback, {failed_rate:.1f}% failed of {self.parsed} model responses"
+        ]
+        return "\n".join(lines)